@@ -0,0 +1,71 @@
+"""Справочники, заранее собранные в JSON и сжатые.
+
+Весь список ингредиентов или тегов рендерится один раз на версию данных
+в каждом процессе, вместе с вариантами gzip и brotli (если установлен
+пакет brotli). Ответ выбирает вариант по Accept-Encoding.
+"""
+import gzip
+import re
+import threading
+
+from recipes.models import Ingredients, Tags
+from recipes.versions import get_local_version
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import IngredientsSerializer, TagsSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = (
+    ('br', re.compile(r'\bbr\b'),
+     brotli and (lambda body: brotli.compress(body, quality=11))),
+    ('gzip', re.compile(r'\bgzip\b'),
+     lambda body: gzip.compress(body, compresslevel=9, mtime=0)),
+)
+
+
+class Catalog:
+    """Байты справочника и их сжатые варианты для текущей версии."""
+
+    def __init__(self, version_name, serializer_class, queryset):
+        self.version_name = version_name
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self._lock = threading.Lock()
+        self._version = None
+        self._bodies = {}
+
+    def _load(self):
+        version = get_local_version(self.version_name)
+        if version == self._version:
+            return self._bodies
+        with self._lock:
+            if version != self._version:
+                body = JSONRenderer().render(self.serializer_class(
+                    self.queryset.all(), many=True).data)
+                bodies = {None: body}
+                for encoding, _, compress in ENCODINGS:
+                    if compress is not None:
+                        bodies[encoding] = compress(body)
+                self._bodies = bodies
+                self._version = version
+        return self._bodies
+
+    def negotiate(self, request):
+        """Лучшее сжатие из принимаемых клиентом или None."""
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        for encoding, pattern, compress in ENCODINGS:
+            if compress is not None and pattern.search(accept):
+                return encoding
+        return None
+
+    def get_body(self, encoding):
+        return self._load()[encoding]
+
+
+ingredients_catalog = Catalog('ingredients', IngredientsSerializer,
+                              Ingredients.objects)
+tags_catalog = Catalog('tags', TagsSerializer, Tags.objects)
@@ -2,26 +2,43 @@ from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipes
+from recipes.search import search_recipes
+from .indexes import tags_map
 
 
 class RecipesFilter(FilterSet):
     """Фильтр рецептов."""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(choices=tags_map.choices,
+                                        method='filter_tags')
     is_favorited = filters.BooleanFilter(method='favorite')
     is_in_shopping_cart = filters.BooleanFilter(method='shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipes
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(id__in=Recipes.tags.through.objects.filter(
+            tags_id__in=tags_map.get_ids(value)
+        ).values('recipes_id'))
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
 
     def favorite(self, queryset, name, value):
         if value:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
 
@@ -0,0 +1,176 @@
+"""Индексы в памяти процесса для быстрого поиска.
+"""
+import bisect
+import threading
+from array import array
+from collections import Counter
+from itertools import chain
+
+from recipes.models import IngredientInRecipe, Ingredients, Tags
+from recipes.search import normalize
+from recipes.versions import get_changes, get_local_version
+
+MAX_INDEX_CHANGES = 1000
+
+
+class IngredientsIndex:
+    """Отсортированный индекс названий ингредиентов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _load(self):
+        version = get_local_version('ingredients')
+        if version == self._version:
+            return self._keys, self._items
+        with self._lock:
+            if version != self._version:
+                rows = sorted(
+                    Ingredients.objects.values(
+                        'id', 'name', 'measurement_unit'),
+                    key=lambda row: (
+                        normalize(row['name']), row['name'], row['id'])
+                )
+                self._keys = [normalize(row['name']) for row in rows]
+                self._items = rows
+                self._version = version
+        return self._keys, self._items
+
+    def search(self, query, limit):
+        """Точные совпадения, затем по началу строки, затем по подстроке."""
+        keys, items = self._load()
+        query = normalize(query.strip())
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        exact = [items[i] for i in range(start, end) if keys[i] == query]
+        prefix = [items[i] for i in range(start, end) if keys[i] != query]
+        result = (exact + prefix)[:limit]
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not start <= position < end:
+                    result.append(items[position])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+class TagsMap:
+    """Соответствие слагов тегов их id."""
+
+    def __init__(self):
+        self._version = None
+        self._ids = {}
+
+    def _load(self):
+        version = get_local_version('tags')
+        if version != self._version:
+            self._ids = dict(Tags.objects.values_list('slug', 'id'))
+            self._version = version
+        return self._ids
+
+    def choices(self):
+        return [(slug, slug) for slug in self._load()]
+
+    def get_ids(self, slugs):
+        ids = self._load()
+        return [ids[slug] for slug in slugs if slug in ids]
+
+
+class RecipeIngredientsIndex:
+    """Обратный индекс: id ингредиента — отсортированный массив id рецептов.
+
+    Изменения рецептов применяются по одному рецепту, если они есть в
+    журнале версий; иначе индекс перечитывается целиком.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._recipes = {}
+
+    def _load(self):
+        """Догоняет версию; вызывается под блокировкой."""
+        version = get_local_version('recipe_ingredients')
+        if version == self._version:
+            return
+        changes = None
+        if (self._version is not None
+                and 0 < version - self._version <= MAX_INDEX_CHANGES):
+            changes = get_changes('recipe_ingredients', self._version, version)
+        if changes is None:
+            self._reload()
+        else:
+            self._update(set(changes))
+        self._version = version
+
+    def _reload(self):
+        postings = {}
+        recipes = {}
+        rows = IngredientInRecipe.objects.values_list(
+            'ingredient_id', 'recipe_id'
+        ).order_by('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator():
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        self._postings = postings
+        self._recipes = {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def _update(self, recipe_ids):
+        current = {}
+        for ingredient_id, recipe_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'recipe_id'):
+            current.setdefault(recipe_id, set()).add(ingredient_id)
+        for recipe_id in recipe_ids:
+            old = self._recipes.pop(recipe_id, frozenset())
+            new = frozenset(current.get(recipe_id, ()))
+            for ingredient_id in old - new:
+                posting = self._postings[ingredient_id]
+                del posting[bisect.bisect_left(posting, recipe_id)]
+            for ingredient_id in new - old:
+                bisect.insort(
+                    self._postings.setdefault(ingredient_id, array('q')),
+                    recipe_id
+                )
+            if new:
+                self._recipes[recipe_id] = new
+
+    def search(self, ingredient_ids, min_matches):
+        """Рецепты, где есть хотя бы min_matches из ingredient_ids.
+
+        Возвращает кортежи (id, совпало, не хватает), сначала рецепты с
+        меньшим числом недостающих ингредиентов.
+        """
+        with self._lock:
+            self._load()
+            lists = [self._postings[pk] for pk in ingredient_ids
+                     if pk in self._postings]
+            if len(lists) < min_matches:
+                return []
+            if min_matches == len(ingredient_ids):
+                lists.sort(key=len)
+                found = set(lists[0]).intersection(*lists[1:])
+                matches = dict.fromkeys(found, min_matches)
+            else:
+                matches = Counter(chain.from_iterable(lists))
+            result = [
+                (recipe_id, matched, len(self._recipes[recipe_id]) - matched)
+                for recipe_id, matched in matches.items()
+                if matched >= min_matches
+            ]
+        result.sort(key=lambda item: (item[2], -item[1], item[0]))
+        return result
+
+
+ingredients_index = IngredientsIndex()
+recipe_ingredients_index = RecipeIngredientsIndex()
+tags_map = TagsMap()
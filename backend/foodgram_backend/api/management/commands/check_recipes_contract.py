@@ -0,0 +1,66 @@
+from api.serializers import RecipesListSerializer, RecipesSerializer
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import IsFavorite, Recipes, User
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что RecipesListSerializer отдаёт те же байты, '
+            'что RecipesSerializer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500,
+                            help='Сколько рецептов сравнивать')
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя; по умолчанию автор первого избранного')
+
+    def get_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        favorite = IsFavorite.objects.select_related('user').first()
+        return favorite.user if favorite else User.objects.first()
+
+    def compare(self, user, ids):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        context = {'request': request}
+        recipes = Recipes.objects.with_user_flags(user).filter(
+            pk__in=ids).order_by('pk')
+        fast = RecipesListSerializer(
+            recipes.values(*RecipesListSerializer.fields), context=context
+        ).data
+        slow = RecipesSerializer(
+            recipes.with_related(), many=True, context=context).data
+        renderer = JSONRenderer()
+        return [
+            expected['id']
+            for actual, expected in zip(fast, slow)
+            if renderer.render(actual) != renderer.render(expected)
+        ] + ([] if len(fast) == len(slow) else ['длина'])
+
+    def handle(self, *args, **options):
+        ids = list(Recipes.objects.order_by('pk').values_list(
+            'pk', flat=True)[:options['limit']])
+        if not ids:
+            raise CommandError('Нет рецептов для сравнения')
+        failed = False
+        for user in (AnonymousUser(), self.get_user(options['user'])):
+            if user is None:
+                continue
+            mismatched = self.compare(user, ids)
+            self.stdout.write(
+                f'{user}: рецептов {len(ids)}, '
+                f'расхождений {len(mismatched)}'
+            )
+            if mismatched:
+                failed = True
+                self.stdout.write(
+                    f'Не совпадают: {", ".join(map(str, mismatched[:20]))}')
+        if failed:
+            raise CommandError('Быстрый список рецептов расходится с '
+                               'RecipesSerializer')
+        self.stdout.write(self.style.SUCCESS('Вывод совпадает'))
@@ -0,0 +1,178 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import parse_etags, patch_vary_headers
+from recipes.versions import get_versions
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+
+class DataVersionsMixin:
+    """Версии данных, прочитанные не больше одного раза за запрос."""
+
+    def get_data_versions(self, names):
+        known = self.__dict__.setdefault('_data_versions', {})
+        missing = [name for name in names if name not in known]
+        if missing:
+            known.update(zip(missing, get_versions(missing)))
+        return [known[name] for name in names]
+
+
+class ConditionalGetMixin(DataVersionsMixin):
+    """ETag по версиям данных и ответ 304 без сериализации."""
+    etag_versions = ()
+
+    def get_etag_versions(self):
+        return list(self.etag_versions)
+
+    def get_etag(self, request):
+        user = request.user
+        versions = self.get_data_versions(self.get_etag_versions())
+        raw = ':'.join(map(str, (
+            self.basename, self.action, request.get_full_path(),
+            request.accepted_renderer.format,
+            user.pk if user.is_authenticated else 'anonymous',
+            *versions
+        )))
+        return '"{}"'.format(hashlib.sha1(raw.encode()).hexdigest())
+
+    def conditional_response(self, request, handler):
+        etag = self.get_etag(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (
+                etag in parse_etags(if_none_match) or if_none_match == '*'):
+            response = Response(status=HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler()
+        if response.status_code in (HTTP_200_OK, HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
+
+
+class CatalogMixin:
+    """Весь список отдаётся из заранее собранного справочника catalog.
+
+    Нужен ConditionalGetMixin; ETag различается для каждого сжатия.
+    """
+    catalog = None
+
+    def get_etag(self, request):
+        etag = super().get_etag(request)
+        encoding = getattr(request, 'catalog_encoding', None)
+        return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+    def catalog_response(self, encoding):
+        response = HttpResponse(self.catalog.get_body(encoding),
+                                content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        request.catalog_encoding = self.catalog.negotiate(request)
+        response = self.conditional_response(request, partial(
+            self.catalog_response, request.catalog_encoding))
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class SharedCacheMixin(DataVersionsMixin):
+    """Общий кеш ответов list/retrieve для всех пользователей.
+
+    Ключ строится из нормализованной строки запроса и версий данных, так
+    что запись в связанные модели сама делает старые ответы недоступными.
+    В кеше хранится ответ без данных пользователя, для вошедшего
+    пользователя они накладываются поверх в overlay_user_data. Часто
+    меняющиеся общие поля, например счётчики, не входят в версии кеша и
+    обновляются при каждом чтении в overlay_shared_data.
+    Пока один процесс считает холодную страницу, остальные недолго ждут
+    результат, а затем считают страницу сами. Блокировка держится на
+    атомарном cache.add, поэтому кеш должен быть общим для процессов.
+    """
+    cache_versions = ()
+    cache_user_params = ()
+    cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+    cache_lock_timeout = 10
+    cache_wait = settings.RESPONSE_CACHE_WAIT
+
+    def strip_user_data(self, data):
+        return data
+
+    def overlay_user_data(self, data, request):
+        return data
+
+    def overlay_shared_data(self, data):
+        return data
+
+    def get_cache_key(self, request):
+        query = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        raw = ':'.join(map(str, (
+            self.basename, self.action, request.get_host(), request.path,
+            query, *self.get_data_versions(list(self.cache_versions))
+        )))
+        return 'response:{}'.format(hashlib.sha1(raw.encode()).hexdigest())
+
+    def wait_for_cache(self, key):
+        deadline = time.monotonic() + self.cache_wait
+        delay = 0.01
+        while time.monotonic() + delay < deadline:
+            time.sleep(delay)
+            data = cache.get(key)
+            if data is not None:
+                return data
+            delay *= 2
+        return None
+
+    def cached_response(self, request, handler):
+        authenticated = request.user.is_authenticated
+        if authenticated and any(
+                param in request.query_params
+                for param in self.cache_user_params):
+            return handler()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            lock = f'{key}:lock'
+            if cache.add(lock, 1, self.cache_lock_timeout):
+                try:
+                    response = handler()
+                    if response.status_code == HTTP_200_OK:
+                        cache.set(key, self.strip_user_data(response.data)
+                                  if authenticated else response.data,
+                                  self.cache_timeout)
+                    return response
+                finally:
+                    cache.delete(lock)
+            data = self.wait_for_cache(key)
+            if data is None:
+                return handler()
+        data = self.overlay_shared_data(data)
+        if authenticated:
+            data = self.overlay_user_data(data, request)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
@@ -0,0 +1,96 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipesCursorPagination(CursorPagination):
+    """Курсорная навигация по рецептам, новые первыми."""
+    ordering = ('-date', '-id')
+
+
+class SubscriptionsCursorPagination(CursorPagination):
+    """Курсорная навигация по подпискам, новые первыми."""
+    ordering = ('-id',)
+
+
+class CursorOrPageNumberPagination(PageNumberPagination):
+    """Постраничная навигация, с параметром cursor — курсорная.
+
+    Курсорный режим не считает COUNT(*) и не использует OFFSET, поэтому
+    дальние страницы обходятся так же, как первая. Первая страница
+    запрашивается с пустым ?cursor=.
+    """
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipesPagination(CursorOrPageNumberPagination):
+    cursor_pagination_class = RecipesCursorPagination
+
+
+class SubscriptionsPagination(CursorOrPageNumberPagination):
+    cursor_pagination_class = SubscriptionsCursorPagination
+
+
+class FeedPagination(BasePagination):
+    """Навигация по ленте подписок по ключу (date, id), новые первыми."""
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = b64decode(encoded.encode()).decode().split('|')
+            date, pk = parse_datetime(date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def paginate_feed(self, queryset, user, request):
+        """Страница рецептов queryset.feed после курсора из запроса."""
+        self.request = request
+        recipes = list(queryset.feed(
+            user, self.page_size + 1, self.decode_cursor(request)))
+        self.last = recipes[-2] if len(recipes) > self.page_size else None
+        return recipes[:self.page_size]
+
+    def get_next_link(self):
+        if self.last is None:
+            return None
+        cursor = b64encode(
+            f'{self.last.date.isoformat()}|{self.last.pk}'.encode()
+        ).decode()
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data)
+        ]))
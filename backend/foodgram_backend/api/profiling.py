@@ -0,0 +1,143 @@
+"""Выборочное профилирование запросов.
+
+Для доли запросов REQUEST_PROFILING_RATE считает число SQL-запросов, их
+общее время и самый долгий из них, а также время view, сериализаторов и
+рендерера. Итог отдаётся в заголовке Server-Timing и пишется в лог одной
+JSON-строкой. Если доля равна нулю, middleware отключается целиком.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+SQL_PREVIEW_LENGTH = 300
+PROFILED_PROPERTIES = (
+    (BaseSerializer, 'data', 'serializer'),
+    (Response, 'rendered_content', 'render'),
+)
+
+
+class Profile:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.timings = {name: 0.0 for _, _, name in PROFILED_PROPERTIES}
+        self.active = set()
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql[:SQL_PREVIEW_LENGTH]
+
+
+def timed(name, func):
+    """Добавляет время func в раздел name профиля текущего запроса.
+
+    Вложенные вызовы, например сериализатор внутри сериализатора,
+    учитываются один раз.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None or name in profile.active:
+            return func(*args, **kwargs)
+        profile.active.add(name)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.timings[name] += time.perf_counter() - started
+            profile.active.discard(name)
+    wrapper.profiled = True
+    return wrapper
+
+
+def install():
+    """Оборачивает свойства сериализатора и ответа DRF один раз."""
+    for cls, attribute, name in PROFILED_PROPERTIES:
+        prop = cls.__dict__[attribute]
+        if not getattr(prop.fget, 'profiled', False):
+            setattr(cls, attribute, property(timed(name, prop.fget)))
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class ProfilingMiddleware:
+    """Профилирует случайную долю запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = settings.REQUEST_PROFILING_RATE
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        install()
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+        profile = Profile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.report(request, response, profile,
+                    time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, profile, total):
+        render = profile.timings['render']
+        timings = {
+            'db': profile.db_time,
+            'view': total - render,
+            'serializer': profile.timings['serializer'],
+            'render': render,
+            'total': total,
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={ms(value)}'
+            + (f';desc="{profile.queries} queries"' if name == 'db' else '')
+            for name, value in timings.items()
+        )
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': profile.queries,
+            **{f'{name}_ms': ms(value) for name, value in timings.items()},
+            'slowest_query_ms': ms(profile.slowest_time),
+            'slowest_query': profile.slowest_sql,
+        }, ensure_ascii=False))
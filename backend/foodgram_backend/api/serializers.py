@@ -1,5 +1,6 @@
 import webcolors
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
@@ -7,8 +8,13 @@ from rest_framework.serializers import SerializerMethodField
 
 from recipes.models import (IngredientInRecipe, Ingredients, IsFavorite,
                             IsInShoppingCart, IsSubscribed, Recipes, Tags)
+from recipes.images import schedule_renditions
+from recipes.signals import recipe_ingredients_changed_on_commit
+from recipes.versions import bump_version_on_commit
 from users.models import User
 
+from .utils import get_following_ids
+
 
 class Hex2NameColor(serializers.Field):
     def to_representation(self, value):
@@ -58,16 +64,16 @@ class UserSerializer(UserCreateSerializer, UserSerializer):
 
     class Meta:
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'password', 'is_subscribed',)
+                  'last_name', 'password', 'is_subscribed',
+                  'recipes_count', 'followers_count',)
+        read_only_fields = ('recipes_count', 'followers_count',)
         model = User
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        author = get_object_or_404(User, username=obj.username)
-        return IsSubscribed.objects.filter(user=request.user.id,
-                                           author=author.id).exists()
+        return obj.id in get_following_ids(request)
 
 
 class RecipesSerializer(serializers.ModelSerializer):
@@ -85,10 +91,13 @@ class RecipesSerializer(serializers.ModelSerializer):
         fields = ('id', 'tags', 'author',
                   'ingredients', 'is_favorited',
                   'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time',)
+                  'image_thumbnail', 'image_card',
+                  'text', 'cooking_time', 'favorites_count',)
         model = Recipes
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -96,10 +105,105 @@ class RecipesSerializer(serializers.ModelSerializer):
             user=request.user, recipe=obj).exists()
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous or (user == obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        request = self.context.get('request')
+        if not request or request.user.is_anonymous:
             return False
-        return IsFavorite.objects.filter(user=user, recipe=obj).exists()
+        return IsFavorite.objects.filter(
+            user=request.user, recipe=obj).exists()
+
+
+class RecipesListSerializer(serializers.BaseSerializer):
+    """Список рецептов из строк values() без ModelSerializer.
+
+    Отдаёт те же байты, что RecipesSerializer, но не создаёт модели и не
+    обходит поля сериализаторов. Совпадение проверяют тесты api.tests и,
+    на рабочих данных, команда check_recipes_contract.
+    """
+    fields = (
+        'id', 'name', 'image', 'image_thumbnail', 'image_card', 'text',
+        'cooking_time', 'date', 'favorites_count', 'is_favorited',
+        'is_in_shopping_cart', 'author_id', 'author__email',
+        'author__username', 'author__first_name', 'author__last_name',
+        'author__recipes_count', 'author__followers_count',
+    )
+    storage = Recipes._meta.get_field('image').storage
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        """Весь список собирается сразу, без ListSerializer."""
+        return cls(*args, **kwargs)
+
+    def file_url(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_tags(self, ids):
+        tags = {}
+        for row in Recipes.tags.through.objects.filter(
+            recipes_id__in=ids
+        ).order_by('tags__name').values_list(
+            'recipes_id', 'tags__id', 'tags__name', 'tags__color',
+            'tags__slug'
+        ):
+            tags.setdefault(row[0], []).append(
+                {'id': row[1], 'name': row[2], 'color': row[3],
+                 'slug': row[4]})
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = {}
+        for row in IngredientInRecipe.objects.filter(
+            recipe_id__in=ids
+        ).order_by('ingredient__name', 'ingredient_id').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            ingredients.setdefault(row[0], []).append(
+                {'id': row[1], 'name': row[2], 'measurement_unit': row[3],
+                 'amount': row[4]})
+        return ingredients
+
+    def to_representation(self, rows):
+        ids = [row['id'] for row in rows]
+        tags = self.get_tags(ids)
+        ingredients = self.get_ingredients(ids)
+        request = self.context.get('request')
+        following = (
+            get_following_ids(request)
+            if request and request.user.is_authenticated else ()
+        )
+        return [
+            {
+                'id': row['id'],
+                'tags': tags.get(row['id'], []),
+                'author': {
+                    'email': row['author__email'],
+                    'id': row['author_id'],
+                    'username': row['author__username'],
+                    'first_name': row['author__first_name'],
+                    'last_name': row['author__last_name'],
+                    'is_subscribed': row['author_id'] in following,
+                    'recipes_count': row['author__recipes_count'],
+                    'followers_count': row['author__followers_count'],
+                },
+                'ingredients': ingredients.get(row['id'], []),
+                'is_favorited': row['is_favorited'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'name': row['name'],
+                'image': self.file_url(row['image']),
+                'image_thumbnail': self.file_url(row['image_thumbnail']),
+                'image_card': self.file_url(row['image_card']),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'favorites_count': row['favorites_count'],
+            }
+            for row in rows
+        ]
 
 
 class IngredientCreateSerializer(serializers.ModelSerializer):
@@ -115,43 +219,56 @@ class IngredientCreateSerializer(serializers.ModelSerializer):
 class RecipeCreateSerializer(serializers.ModelSerializer):
     '''Сериализатор создания рецепта'''
     image = Base64ImageField(max_length=None, required=False, use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tags.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientCreateSerializer(many=True)
 
     class Meta:
         model = Recipes
         fields = '__all__'
-        read_only_fields = ('author',)
+        read_only_fields = ('author', 'favorites_count',)
+
+    def validate_tags(self, value):
+        if not value:
+            raise serializers.ValidationError('Не выбран тэг.')
+        errors = []
+        if len(set(value)) != len(value):
+            errors.append('Теги не должны повторяться')
+        missing = set(value) - set(
+            Tags.objects.filter(id__in=value).values_list('id', flat=True))
+        if missing:
+            errors.append(
+                f'Нет тегов с id: {", ".join(map(str, sorted(missing)))}')
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
 
-    def validate(self, data):
-        if not data['tags']:
-            raise serializers.ValidationError(
-                'Не выбран тэг.'
-            )
-        ingredients_list = []
-        if not data['ingredients']:
-            raise serializers.ValidationError(
-                'Не выбран ингредиент'
+    def validate_ingredients(self, value):
+        if not value:
+            raise serializers.ValidationError('Не выбран ингредиент')
+        errors = []
+        ids = [ingredient['id'] for ingredient in value]
+        if len(set(ids)) != len(ids):
+            errors.append('Поле ингредиенты должно быть уникальным')
+        if any(ingredient['amount'] < 1 for ingredient in value):
+            errors.append('Количество ингредиента должно быть больше 1')
+        missing = set(ids) - set(Ingredients.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        if missing:
+            errors.append(
+                'Нет ингредиентов с id: '
+                f'{", ".join(map(str, sorted(missing)))}'
             )
-        for value in data['ingredients']:
-            amount = value['amount']
-            ingredient = get_object_or_404(Ingredients, id=value['id'])
-            if ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    'Поле ингредиенты должно быть уникальным'
-                )
-            if amount < 1:
-                raise serializers.ValidationError(
-                    'Количество ингредиента должно быть больше 1'
-                )
-            ingredients_list.append(ingredient)
-        if data['cooking_time'] < 1:
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+    def validate_image(self, value):
+        if value and value.size > settings.RECIPE_IMAGE_MAX_SIZE:
             raise serializers.ValidationError(
-                'Время приготовления должно быть больше 1 минуты'
+                'Размер изображения не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ'
             )
-        return data
+        return value
 
     def create_ingredients(self, ingredient_in_recipe, recipe):
         list_obj = []
@@ -165,27 +282,76 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         IngredientInRecipe.objects.bulk_create(list_obj)
 
+    def update_ingredients(self, ingredients, recipe):
+        """Меняет только добавленные, удалённые и изменённые ингредиенты."""
+        submitted = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        removed = current.keys() - submitted.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        self.create_ingredients(
+            [ingredient for ingredient in ingredients
+             if ingredient['id'] not in current],
+            recipe
+        )
+        changed = [
+            row for ingredient_id, row in current.items()
+            if ingredient_id in submitted
+            and row.amount != submitted[ingredient_id]
+        ]
+        for row in changed:
+            row.amount = submitted[row.ingredient_id]
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        # Удалённые строки приходят через post_delete, а bulk_create и
+        # bulk_update сигналов не шлют: их ингредиенты добавляются явно.
+        recipe_ingredients_changed_on_commit(
+            recipe.id,
+            (submitted.keys() - current.keys())
+            | {row.ingredient_id for row in changed}
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipes.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        bump_version_on_commit('recipe_ingredients', recipe.id)
+        if recipe.image:
+            schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.update_ingredients(
+                validated_data.pop('ingredients'), instance)
         if 'tags' in validated_data:
             instance.tags.set(
                 validated_data.pop('tags'))
-        return super().update(instance, validated_data)
+        if 'image' in validated_data:
+            instance.image_thumbnail = None
+            instance.image_card = None
+        instance = super().update(instance, validated_data)
+        if validated_data.get('image'):
+            schedule_renditions(instance)
+        return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipes.objects.with_related().with_user_flags(
+            request and request.user
+        ).get(pk=instance.pk)
         return RecipesSerializer(
-            instance, context={'request': self.context.get('request')}).data
+            instance, context={'request': request}).data
 
 
 class IsInShoppingSerializer(serializers.ModelSerializer):
@@ -218,7 +384,8 @@ class RecipesRepresentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipes
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'image_card',
+                  'cooking_time',)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -230,27 +397,55 @@ class FollowSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.ReadOnlyField(source='author.recipes.count')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
+    followers_count = serializers.ReadOnlyField(
+        source='author.followers_count')
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count',)
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count',)
 
     def get_is_subscribed(self, obj):
-        return IsSubscribed.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        return obj.pk is not None
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
+        recipes = self.context.get('recipes')
+        if recipes is not None:
+            return RecipesRepresentSerializer(
+                recipes.get(obj.author_id, []), many=True).data
+        limit = self.context.get('recipes_limit')
         queryset = Recipes.objects.filter(author=obj.author)
         if limit:
-            queryset = queryset[:int(limit)]
+            queryset = queryset[:limit]
         return RecipesRepresentSerializer(queryset, many=True).data
 
 
+class RecipesLimitSerializer(serializers.Serializer):
+    """Сериализатор параметра recipes_limit."""
+    recipes_limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class IngredientsSetSerializer(serializers.Serializer):
+    """Сериализатор параметров поиска рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.INGREDIENTS_SET_MAX_SIZE
+    )
+    min_matches = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, data):
+        data['ingredients'] = set(data['ingredients'])
+        data.setdefault('min_matches', len(data['ingredients']))
+        if data['min_matches'] > len(data['ingredients']):
+            raise serializers.ValidationError({
+                'min_matches': 'Не больше числа переданных ингредиентов'
+            })
+        return data
+
+
 class IsSubscribedSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -277,10 +472,8 @@ class IsSubscribedSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
         return FollowSerializer(
-            instance, context=context
+            instance, context=self.context
         ).data
 
 
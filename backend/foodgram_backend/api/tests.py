@@ -0,0 +1,433 @@
+from io import StringIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from recipes.models import (IngredientInRecipe, Ingredients, IsFavorite,
+                            IsInShoppingCart, IsSubscribed, Recipes,
+                            ShoppingCartTotal, SimilarRecipe, Tags, User)
+from recipes.versions import bump_version, get_version
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .indexes import ingredients_index
+from .serializers import (RecipeCreateSerializer, RecipesListSerializer,
+                          RecipesSerializer)
+
+
+class IngredientsSearchTest(TestCase):
+    """Поиск ингредиентов по началу названия."""
+
+    def setUp(self):
+        ingredients_index._version = None
+        Ingredients.objects.bulk_create([
+            Ingredients(name='пекарский порошок', measurement_unit='г'),
+            Ingredients(name='пекарский порошок', measurement_unit='ч. л.'),
+            Ingredients(name='соль', measurement_unit='г'),
+            Ingredients(name='соль', measurement_unit='щепотка'),
+            Ingredients(name='солёные огурцы', measurement_unit='шт.'),
+        ])
+        self.client = APIClient()
+
+    def test_same_name_with_different_units(self):
+        response = self.client.get('/api/ingredients/', {'name': 'сол'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['name'], row['measurement_unit'])
+             for row in response.json()],
+            [('солёные огурцы', 'шт.'), ('соль', 'г'), ('соль', 'щепотка')]
+        )
+
+    def test_search_reads_version_once(self):
+        self.client.get('/api/ingredients/', {'name': 'сол'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ingredients/', {'name': 'пек'})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_exact_match_first(self):
+        response = self.client.get('/api/ingredients/', {'name': 'соль'})
+        self.assertEqual(
+            [row['measurement_unit'] for row in response.json()],
+            ['г', 'щепотка']
+        )
+
+
+class DataVersionTest(TestCase):
+    """Версии данных общие для процессов и не зависят от кеша."""
+
+    def setUp(self):
+        Tags.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.client = APIClient()
+
+    def test_etag_does_not_depend_on_cache(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        cache.clear()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_changes_etag(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        bump_version('tags')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_signal_bumps_after_commit(self):
+        version = get_version('tags')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Tags.objects.create(name='Ужин', color='#8775D2', slug='dinner')
+            self.assertEqual(get_version('tags'), version)
+        self.assertTrue(callbacks)
+        self.assertNotEqual(get_version('tags'), version)
+
+    def test_load_data_changes_etag(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        call_command('load_data', stdout=StringIO())
+        response = self.client.get('/api/ingredients/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json())
+
+
+class FavoritesCountTest(TestCase):
+    """Счётчик избранного не сбрасывает общий кеш рецептов."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.recipe = Recipes.objects.create(
+            author=self.author, name='Омлет', text='Взбить и пожарить',
+            cooking_time=10, image='recipes/images/omelette.jpg')
+        self.client = APIClient()
+
+    def test_cached_list_shows_current_count(self):
+        self.client.get('/api/recipes/')
+        version = get_version('recipes')
+        with self.captureOnCommitCallbacks(execute=True):
+            IsFavorite.objects.create(user=self.reader, recipe=self.recipe)
+        self.assertEqual(get_version('recipes'), version)
+        results = self.client.get('/api/recipes/').json()['results']
+        self.assertEqual(results[0]['favorites_count'], 1)
+        detail = self.client.get(f'/api/recipes/{self.recipe.pk}/').json()
+        self.assertEqual(detail['favorites_count'], 1)
+
+    def test_recipe_update_keeps_concurrent_favorite(self):
+        recipe = Recipes.objects.get(pk=self.recipe.pk)
+        IsFavorite.objects.create(user=self.reader, recipe=self.recipe)
+        request = Request(APIRequestFactory().patch('/api/recipes/'))
+        request.user = self.author
+        serializer = RecipeCreateSerializer(
+            recipe, data={'name': 'Яичница'}, partial=True,
+            context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Яичница')
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_user_save_keeps_concurrent_follower(self):
+        author = User.objects.get(pk=self.author.pk)
+        IsSubscribed.objects.create(user=self.reader, author=self.author)
+        author.first_name = 'Автор'
+        author.save()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.first_name, 'Автор')
+        self.assertEqual(self.author.followers_count, 1)
+
+    def test_favorite_changes_etag(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            IsFavorite.objects.create(user=self.reader, recipe=self.recipe)
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SharedCacheTest(TestCase):
+    """Общий кеш рецептов не смешивает данные пользователей."""
+
+    def setUp(self):
+        self.author, self.alice, self.bob = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pass')
+            for name in ('author', 'alice', 'bob')
+        )
+        self.first, self.second = (
+            Recipes.objects.create(
+                author=self.author, name=name, text='Готовить',
+                cooking_time=10, image=f'recipes/images/{number}.jpg')
+            for number, name in enumerate(('Омлет', 'Блины'))
+        )
+        IsFavorite.objects.create(user=self.alice, recipe=self.first)
+        IsInShoppingCart.objects.create(user=self.alice, recipe=self.second)
+        IsSubscribed.objects.create(user=self.alice, author=self.author)
+        IsFavorite.objects.create(user=self.bob, recipe=self.second)
+
+    def get(self, user, url, params=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_list(self, user, params=None):
+        return {
+            recipe['id']: recipe
+            for recipe in self.get(user, '/api/recipes/', params)['results']
+        }
+
+    def flags(self, recipe):
+        return (recipe['is_favorited'], recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'])
+
+    def warm(self, url):
+        """Кеширует ответ для alice и меняет рецепты в обход версий."""
+        self.get(self.alice, url)
+        Recipes.objects.update(name='Изменено')
+
+    def test_list_gets_own_flags(self):
+        self.warm('/api/recipes/')
+        recipes = self.get_list(self.bob)
+        self.assertEqual(recipes[self.first.pk]['name'], 'Омлет')
+        self.assertEqual(self.flags(recipes[self.first.pk]),
+                         (False, False, False))
+        self.assertEqual(self.flags(recipes[self.second.pk]),
+                         (True, False, False))
+        recipes = self.get_list(self.alice)
+        self.assertEqual(self.flags(recipes[self.first.pk]),
+                         (True, False, True))
+        self.assertEqual(self.flags(recipes[self.second.pk]),
+                         (False, True, True))
+
+    def test_anonymous_list_after_authenticated(self):
+        self.warm('/api/recipes/')
+        recipes = self.get_list(None)
+        self.assertEqual(recipes[self.first.pk]['name'], 'Омлет')
+        for recipe in recipes.values():
+            self.assertEqual(self.flags(recipe), (False, False, False))
+
+    def test_detail_gets_own_flags(self):
+        url = f'/api/recipes/{self.second.pk}/'
+        self.warm(url)
+        recipe = self.get(self.bob, url)
+        self.assertEqual(recipe['name'], 'Блины')
+        self.assertEqual(self.flags(recipe), (True, False, False))
+        recipe = self.get(None, url)
+        self.assertEqual(self.flags(recipe), (False, False, False))
+
+    def test_user_params_bypass_cache(self):
+        self.get_list(self.alice, {'is_favorited': 1})
+        recipes = self.get_list(self.bob, {'is_favorited': 1})
+        self.assertEqual(list(recipes), [self.second.pk])
+        Recipes.objects.update(name='Изменено')
+        recipes = self.get_list(self.alice, {'is_favorited': 1})
+        self.assertEqual(list(recipes), [self.first.pk])
+        self.assertEqual(recipes[self.first.pk]['name'], 'Изменено')
+
+
+class UpdateIngredientsTest(TestCase):
+    """Изменение состава рецепта обновляет итоги корзин."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        self.tag = Tags.objects.create(name='Обед', color='#49B64E',
+                                       slug='lunch')
+        self.salt, self.flour, self.milk = (
+            Ingredients.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('мука', 'г'), ('молоко', 'мл'))
+        )
+        self.recipe = Recipes.objects.create(
+            author=self.author, name='Блины', text='Смешать и пожарить',
+            cooking_time=30, image='recipes/images/pancakes.jpg')
+        self.recipe.tags.set([self.tag])
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=self.recipe, ingredient=self.salt,
+                               amount=5),
+            IngredientInRecipe(recipe=self.recipe, ingredient=self.flour,
+                               amount=200),
+        ])
+        IsInShoppingCart.objects.create(user=self.buyer, recipe=self.recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_removed_ingredient_leaves_totals(self):
+        version = get_version('recipes')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {'ingredients': [{'id': self.flour.pk, 'amount': 250},
+                                 {'id': self.milk.pk, 'amount': 500}],
+                 'tags': [self.tag.pk]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            dict(ShoppingCartTotal.objects.filter(
+                user=self.buyer).values_list('ingredient__name', 'amount')),
+            {'мука': 250, 'молоко': 500}
+        )
+        self.assertNotEqual(get_version('recipes'), version)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.similar_stale)
+
+
+class SubscribeTest(TestCase):
+    """Подписка на автора."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        for number in range(3):
+            Recipes.objects.create(
+                author=self.author, name=f'Рецепт {number}', text='Готовить',
+                cooking_time=5, image=f'recipes/images/{number}.jpg')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.url = f'/api/users/{self.author.pk}/subscribe/'
+
+    def test_invalid_limit_does_not_subscribe(self):
+        response = self.client.post(self.url + '?recipes_limit=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IsSubscribed.objects.exists())
+        response = self.client.post(self.url + '?recipes_limit=2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['recipes']), 2)
+
+
+class SimilarRecipesTest(TestCase):
+    """Похожие рецепты."""
+
+    def test_non_numeric_pk(self):
+        response = APIClient().get('/api/recipes/abc/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_recipe(self):
+        response = APIClient().get('/api/recipes/999/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_absolute_image_urls(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        recipe, similar = (
+            Recipes.objects.create(
+                author=author, name=name, text='Готовить', cooking_time=10,
+                image=f'recipes/images/{number}.jpg')
+            for number, name in enumerate(('Блины', 'Оладьи'))
+        )
+        SimilarRecipe.objects.create(recipe=recipe, similar=similar,
+                                     score=0.5)
+        response = APIClient().get(f'/api/recipes/{recipe.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['image'],
+                         'http://testserver/media/recipes/images/1.jpg')
+
+
+class RecipesListContractTest(TestCase):
+    """Быстрый список рецептов отдаёт те же байты, что RecipesSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pass',
+                first_name=name.title())
+            for name in ('author', 'other', 'reader')
+        )
+        tags = [
+            Tags.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Ужин', '#8775D2', 'dinner'),
+                ('Завтрак', '#E26C2D', 'breakfast'),
+            )
+        ]
+        ingredients = [
+            Ingredients.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('яйца', 'шт.'), ('молоко', 'мл'),
+                               ('ёжевика', 'г'), ('мука', 'г'))
+        ]
+        recipes = []
+        for number, author in enumerate(
+                (cls.author, cls.other, cls.author)):
+            recipe = Recipes.objects.create(
+                author=author, name=f'Рецепт {number}', text='Готовить',
+                cooking_time=5 + number,
+                image=f'recipes/images/{number}.jpg',
+                image_thumbnail=(
+                    f'recipes/renditions/{number}_160.webp'
+                    if number else None),
+                image_card=(
+                    f'recipes/renditions/{number}_640.webp'
+                    if number else None),
+            )
+            recipe.tags.set(tags[number % 2:])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=10 * (index + 1))
+                for index, ingredient in enumerate(ingredients[number:])
+            )
+            recipes.append(recipe)
+        IsFavorite.objects.create(user=cls.reader, recipe=recipes[0])
+        IsFavorite.objects.create(user=cls.other, recipe=recipes[0])
+        IsFavorite.objects.create(user=cls.reader, recipe=recipes[1])
+        IsInShoppingCart.objects.create(user=cls.reader, recipe=recipes[1])
+        IsInShoppingCart.objects.create(user=cls.author, recipe=recipes[2])
+        IsSubscribed.objects.create(user=cls.reader, author=cls.author)
+
+    def render(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        context = {'request': request}
+        recipes = Recipes.objects.with_user_flags(user).order_by('pk')
+        renderer = JSONRenderer()
+        fast = RecipesListSerializer(
+            recipes.values(*RecipesListSerializer.fields), many=True,
+            context=context).data
+        slow = RecipesSerializer(
+            recipes.with_related(), many=True, context=context).data
+        return renderer.render(fast), renderer.render(slow)
+
+    def test_anonymous(self):
+        fast, slow = self.render(AnonymousUser())
+        self.assertEqual(fast, slow)
+
+    def test_authenticated(self):
+        user = User.objects.get(pk=self.reader.pk)
+        fast, slow = self.render(user)
+        self.assertEqual(fast, slow)
+        self.assertIn(b'"is_favorited":true', fast)
+        self.assertIn(b'"is_in_shopping_cart":true', fast)
+        self.assertIn(b'"is_subscribed":true', fast)
+
+    def test_list_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.reader
+        expected = RecipesSerializer(
+            Recipes.objects.with_related().with_user_flags(self.reader),
+            many=True, context={'request': request}
+        ).data
+        for _ in range(2):
+            response = client.get('/api/recipes/', {'limit': 10})
+            self.assertEqual(
+                JSONRenderer().render(response.json()['results']),
+                JSONRenderer().render(expected)
+            )
+
+    @override_settings(REQUEST_PROFILING_RATE=1)
+    def test_profiled_as_serializer(self):
+        with self.assertLogs('api.profiling', 'INFO'):
+            response = APIClient().get('/api/recipes/')
+        timings = dict(
+            item.split(';')[0:2]
+            for item in response['Server-Timing'].split(', ')
+        )
+        self.assertGreater(float(timings['serializer'].split('=')[1]), 0)
@@ -1,13 +1,77 @@
 """Модуль вспомогательных функций.
 """
+import csv
+import json
 
+from recipes.models import IsFavorite, IsInShoppingCart, IsSubscribed
 
-def create_list_shopping_cart(ingredients):
-    shopping_cart = ['Список покупок:\n--------------']
+USER_SETS = {
+    'favorites': (IsFavorite, 'recipe_id'),
+    'shopping_carts': (IsInShoppingCart, 'recipe_id'),
+    'subscriptions': (IsSubscribed, 'author_id'),
+}
+
+
+def get_user_set(user, name):
+    """Множество id из избранного, корзины или подписок пользователя.
+
+    Читается одним запросом по индексу: это дешевле, чем узнать версию
+    набора и затем обратиться за ним к кешу.
+    """
+    model, field = USER_SETS[name]
+    return frozenset(model.objects.filter(user=user).order_by().values_list(
+        field, flat=True))
+
+
+def get_following_ids(request):
+    """Id авторов, на которых подписан пользователь, один запрос на ответ."""
+    if not hasattr(request, 'following_ids'):
+        request.following_ids = get_user_set(request.user, 'subscriptions')
+    return request.following_ids
+
+
+def shopping_cart_txt(ingredients):
+    yield 'Список покупок:\n--------------'
     for position, ingredient in enumerate(ingredients, start=1):
-        shopping_cart.append(
+        yield (
             f'\n{position}. {ingredient["ingredient__name"]}:'
             f' {ingredient["amount"]}'
             f'({ingredient["ingredient__measurement_unit"]})'
         )
-    return shopping_cart
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def shopping_cart_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+    'json': shopping_cart_json,
+}
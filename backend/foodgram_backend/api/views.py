@@ -1,5 +1,8 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from copy import deepcopy
+from functools import partial
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -7,29 +10,98 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
 
-from recipes.models import (IngredientInRecipe, Ingredients, IsFavorite,
-                            IsInShoppingCart, IsSubscribed, Recipes, Tags,
-                            User)
+from recipes.models import (Ingredients, IsFavorite, IsInShoppingCart,
+                            IsSubscribed, Recipes, ShoppingCartTotal,
+                            SimilarRecipe, Tags, User)
+from .catalogs import ingredients_catalog, tags_catalog
 from .filters import IngredientsSearchFilter, RecipesFilter
+from .indexes import ingredients_index, recipe_ingredients_index
+from .mixins import CatalogMixin, ConditionalGetMixin, SharedCacheMixin
+from .pagination import (FeedPagination, RecipesPagination,
+                         SubscriptionsPagination)
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (FollowSerializer, IngredientsSerializer,
-                          IsFavoriteSerializer, IsInShoppingSerializer,
-                          IsSubscribedSerializer, RecipeCreateSerializer,
+                          IngredientsSetSerializer, IsFavoriteSerializer,
+                          IsInShoppingSerializer, IsSubscribedSerializer,
+                          RecipeCreateSerializer, RecipesLimitSerializer,
+                          RecipesListSerializer, RecipesRepresentSerializer,
                           RecipesSerializer, TagsSerializer)
-from .utils import create_list_shopping_cart
+from .utils import SHOPPING_CART_FORMATS, get_following_ids, get_user_set
+
+SHOPPING_CART_CHUNK_SIZE = 500
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ConditionalGetMixin, SharedCacheMixin,
+                     viewsets.ModelViewSet):
     queryset = Recipes.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipesFilter
-    pagination_class = PageNumberPagination
+    pagination_class = RecipesPagination
+    lookup_value_regex = r'\d+'
+    cache_versions = ('recipes', 'tags', 'ingredients', 'users')
+    etag_versions = cache_versions + ('favorites_count',)
+    cache_user_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def get_etag_versions(self):
+        versions = super().get_etag_versions()
+        user = self.request.user
+        if user.is_authenticated:
+            versions += [f'favorites:{user.pk}', f'shopping_carts:{user.pk}',
+                         f'subscriptions:{user.pk}']
+        return versions
+
+    def get_recipes_data(self, data):
+        if self.action == 'retrieve':
+            return [data]
+        return data['results'] if isinstance(data, dict) else data
+
+    def strip_user_data(self, data):
+        data = deepcopy(data)
+        for recipe in self.get_recipes_data(data):
+            recipe['is_favorited'] = False
+            recipe['is_in_shopping_cart'] = False
+            recipe['author']['is_subscribed'] = False
+        return data
+
+    def overlay_shared_data(self, data):
+        recipes = self.get_recipes_data(data)
+        counts = dict(Recipes.objects.filter(
+            pk__in=[recipe['id'] for recipe in recipes]
+        ).values_list('pk', 'favorites_count'))
+        for recipe in recipes:
+            recipe['favorites_count'] = counts.get(
+                recipe['id'], recipe['favorites_count'])
+        return data
+
+    def overlay_user_data(self, data, request):
+        favorites = get_user_set(request.user, 'favorites')
+        shopping_carts = get_user_set(request.user, 'shopping_carts')
+        following = get_following_ids(request)
+        for recipe in self.get_recipes_data(data):
+            recipe['is_favorited'] = recipe['id'] in favorites
+            recipe['is_in_shopping_cart'] = recipe['id'] in shopping_carts
+            recipe['author']['is_subscribed'] = (
+                recipe['author']['id'] in following)
+        return data
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Recipes.objects.with_user_flags(self.request.user).values(
+                *RecipesListSerializer.fields)
+        if self.request.method in SAFE_METHODS:
+            return Recipes.objects.with_related().with_user_flags(
+                self.request.user)
+        return Recipes.objects.all()
 
     def get_serializer_class(self):
+        if self.action == 'list':
+            return RecipesListSerializer
         if self.request.method in SAFE_METHODS:
             return RecipesSerializer
         return RecipeCreateSerializer
@@ -75,64 +147,160 @@ class RecipesViewSet(viewsets.ModelViewSet):
         shopping_list.delete()
         return Response(status=HTTP_204_NO_CONTENT)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов из подписок пользователя."""
+        return self.conditional_response(request, partial(
+            self.get_feed, request))
+
+    def get_feed(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(Recipes.objects, request.user,
+                                       request)
+        recipes = self.get_queryset().in_bulk(
+            [recipe.pk for recipe in page])
+        serializer = RecipesSerializer(
+            [recipes[recipe.pk] for recipe in page if recipe.pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """Заранее рассчитанные похожие рецепты."""
+        similar = [
+            row.similar for row in SimilarRecipe.objects.filter(
+                recipe_id=pk
+            ).select_related('similar')[:settings.SIMILAR_RECIPES_COUNT]
+        ]
+        if not similar:
+            get_object_or_404(Recipes, pk=pk)
+        return Response(RecipesRepresentSerializer(
+            similar, many=True, context={'request': request}).data)
+
+    @action(detail=False, url_path='from_ingredients')
+    def from_ingredients(self, request):
+        """Рецепты из имеющихся ингредиентов, меньше недостающих — выше."""
+        params = IngredientsSetSerializer(data=request.GET)
+        params.is_valid(raise_exception=True)
+        found = recipe_ingredients_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['min_matches']
+        )
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(found, request, view=self)
+        recipes = Recipes.objects.with_related().with_user_flags(
+            request.user
+        ).in_bulk([recipe_id for recipe_id, _, _ in page])
+        data = []
+        for recipe_id, matched, missing in page:
+            if recipe_id in recipes:
+                item = RecipesSerializer(
+                    recipes[recipe_id], context={'request': request}).data
+                item['matched_count'] = matched
+                item['missing_count'] = missing
+                data.append(item)
+        return paginator.get_paginated_response(data)
+
     @action(detail=False, methods=['get'],
             url_path='download_shopping_cart',
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request, pk=None):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_carts__user=request.user.id
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        shopping_cart = create_list_shopping_cart(ingredients)
-        response = FileResponse(shopping_cart, as_attachment=True,
-                                content_type='text')
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            SHOPPING_CART_FORMATS[renderer.format](
+                ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
         response['Content-Disposition'] = (
-            'attachment;filename=in_shopping_cart.txt'
+            f'attachment;filename=in_shopping_cart.{renderer.format}'
         )
         return response
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(CatalogMixin, ConditionalGetMixin,
+                         viewsets.ReadOnlyModelViewSet):
     queryset = Ingredients.objects.all()
+    catalog = ingredients_catalog
     serializer_class = IngredientsSerializer
     pagination_class = None
     permission_classes = (AllowAny, )
     filter_backends = [IngredientsSearchFilter]
     search_fields = ('^name',)
+    etag_versions = ('ingredients',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(
+            IngredientsSearchFilter.search_param, '').strip()
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: Response(
+            ingredients_index.search(name, settings.INGREDIENTS_SEARCH_LIMIT)
+        ))
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(CatalogMixin, ConditionalGetMixin,
+                  viewsets.ReadOnlyModelViewSet):
     queryset = Tags.objects.all()
+    catalog = tags_catalog
     serializer_class = TagsSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
+    etag_versions = ('tags',)
 
 
 class UserSubscribeViewSet(UserViewSet):
     pagination_class = PageNumberPagination
 
+    def get_recipes_limit(self):
+        limit_serializer = RecipesLimitSerializer(data=self.request.GET)
+        limit_serializer.is_valid(raise_exception=True)
+        return limit_serializer.validated_data.get('recipes_limit')
+
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        queryset = IsSubscribed.objects.filter(user=user)
-        pages = self.paginate_queryset(queryset)
+        limit = self.get_recipes_limit()
+        queryset = IsSubscribed.objects.filter(
+            user=request.user
+        ).select_related('author')
+        paginator = SubscriptionsPagination()
+        pages = paginator.paginate_queryset(queryset, request, view=self)
+        recipes = Recipes.objects.filter(
+            author_id__in=[follow.author_id for follow in pages]
+        ).only('id', 'name', 'image', 'image_thumbnail', 'image_card',
+               'cooking_time', 'author_id')
+        if limit:
+            recipes = recipes.first_per_author(limit)
+        recipes_by_author = {}
+        for recipe in recipes:
+            recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
         serializer = FollowSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes': recipes_by_author}
         )
-        return self.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['POST'],
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id):
         user = request.user
         author = get_object_or_404(User, id=id)
+        limit = self.get_recipes_limit()
         subscribe = IsSubscribed.objects.create(user=user, author=author)
+        author.refresh_from_db(fields=('followers_count',))
         serializer = IsSubscribedSerializer(
-            subscribe, context={'request': request}
+            subscribe,
+            context={'request': request, 'recipes_limit': limit}
         )
         return Response(serializer.data, status=HTTP_201_CREATED)
 
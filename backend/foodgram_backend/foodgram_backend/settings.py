@@ -59,7 +59,20 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 9
 }
 
+INGREDIENTS_SEARCH_LIMIT = 50
+
+INGREDIENTS_SET_MAX_SIZE = 30
+
+SIMILAR_RECIPES_COUNT = 10
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+RECIPE_IMAGE_WORKERS = 2
+
+REQUEST_PROFILING_RATE = float(os.getenv('REQUEST_PROFILING_RATE', 0))
+
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -100,6 +113,24 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+            'CULL_FREQUENCY': 4,
+        },
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+RESPONSE_CACHE_WAIT = 0.5
+DATA_VERSION_CHECK_INTERVAL = float(
+    os.getenv('DATA_VERSION_CHECK_INTERVAL', default=2))
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -139,3 +170,18 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (IngredientInRecipe, Ingredients, IsFavorite,
-                     IsInShoppingCart, IsSubscribed, Recipes, Tags)
+                     IsInShoppingCart, IsSubscribed, Recipes,
+                     ShoppingCartTotal, Tags)
 
 
 class IngredientInLine(admin.TabularInline):
@@ -18,9 +19,7 @@ class RecipesAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
     def favorite(self, obj):
-        if IsFavorite.objects.filter(recipe=obj).exists():
-            return IsFavorite.objects.filter(recipe=obj).count()
-        return 0
+        return obj.favorites_count
 
 
 class IngredientsAdmin(admin.ModelAdmin):
@@ -37,6 +36,13 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    list_filter = ('user',)
+    search_fields = ('user__username', 'ingredient__name')
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Recipes, RecipesAdmin)
 admin.site.register(Ingredients, IngredientsAdmin)
 admin.site.register(Tags)
@@ -44,3 +50,4 @@ admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
 admin.site.register(IsFavorite)
 admin.site.register(IsSubscribed)
 admin.site.register(IsInShoppingCart)
+admin.site.register(ShoppingCartTotal, ShoppingCartTotalAdmin)
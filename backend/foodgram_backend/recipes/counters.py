@@ -0,0 +1,47 @@
+"""Пересчёт денормализованных счётчиков.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    """Подзапрос числа строк model, ссылающихся полем field на OuterRef."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def recount(model, field, related_model, related_field, dry_run=False):
+    """Пересчитывает счётчик field, возвращает число расхождений."""
+    expected = count_subquery(related_model, related_field)
+    drift = model.objects.annotate(expected=expected).filter(
+        ~Q(**{field: F('expected')})
+    ).count()
+    if drift and not dry_run:
+        model.objects.update(**{field: expected})
+    return drift
+
+
+class UpdateOnlyFieldsMixin:
+    """Не записывает при save() поля, которые меняются только через update().
+
+    Счётчики увеличиваются атомарно выражениями F(), а полное сохранение
+    модели записало бы поверх них значения, прочитанные в начале запроса.
+    """
+    update_only_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.update_only_fields
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,80 @@
+"""Уменьшенные копии изображений рецептов.
+
+Копии строятся в пуле потоков после фиксации транзакции, поэтому запрос
+на создание или изменение рецепта не ждёт обработки изображения.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipes
+from .versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'image_thumbnail': (160, 160),
+    'image_card': (640, 640),
+}
+RENDITION_FORMAT = 'WEBP'
+RENDITION_QUALITY = 80
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def render(source, size):
+    """Уменьшает изображение до размера size и кодирует в WebP."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands()
+                                  else 'RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, RENDITION_FORMAT, quality=RENDITION_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def create_renditions(recipe_id):
+    """Строит копии изображения рецепта и сохраняет ссылки на них."""
+    recipe = Recipes.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    base_name = os.path.splitext(os.path.basename(source))[0]
+    renditions = {}
+    for field_name, size in RENDITIONS.items():
+        with recipe.image.open('rb') as image_file:
+            content = render(image_file, size)
+        field = Recipes._meta.get_field(field_name)
+        name = field.generate_filename(recipe, f'{base_name}_{size[0]}.webp')
+        if field.storage.exists(name):
+            field.storage.delete(name)
+        renditions[field_name] = field.storage.save(name, content)
+    if Recipes.objects.filter(pk=recipe_id, image=source).update(
+            **renditions):
+        bump_version('recipes')
+
+
+def run_renditions(recipe_id):
+    try:
+        create_renditions(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Ставит построение копий в очередь после фиксации транзакции."""
+    transaction.on_commit(lambda: executor.submit(run_renditions, recipe.pk))
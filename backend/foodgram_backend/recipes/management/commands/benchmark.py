@@ -0,0 +1,215 @@
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from recipes.models import (IngredientInRecipe, Ingredients, IsSubscribed,
+                            Recipes, Tags, User)
+from rest_framework.authtoken.models import Token
+
+# Допустимое число SQL-запросов, превышение — регрессия. Версии данных
+# читаются из базы, кеш ответов по умолчанию тоже в базе, поэтому на
+# холодном кеше к запросу добавляются блокировка и запись в кеш.
+# В SQLite создание рецепта ещё два раза обращается к таблице FTS5.
+QUERY_BUDGETS = {
+    'recipes_list': 7,
+    'recipes_filtered': 9,
+    'recipes_feed': 7,
+    'recipe_detail': 7,
+    'subscriptions': 5,
+    'ingredients_search': 3,
+    'download_shopping_cart': 2,
+    'recipe_create': 20,
+}
+COLD_QUERY_BUDGETS = {
+    **QUERY_BUDGETS,
+    'recipes_list': 19,
+    'recipe_detail': 18,
+}
+
+# Замеры идут в тестовой базе со своим кешем в ней же, поэтому очистка
+# кеша и сброс версий не трогают рабочие данные.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'benchmark_cache',
+    }
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержки и число запросов основных эндпоинтов '
+            'на синтетических данных в тестовой базе и проверяет бюджет '
+            'запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом')
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя; по умолчанию тот, у кого больше подписок')
+        parser.add_argument(
+            '--only', nargs='+', choices=sorted(QUERY_BUDGETS),
+            help='Запустить только указанные замеры')
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести результат в JSON')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=100,
+                            help='Пользователей в синтетических данных')
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Рецептов в синтетических данных')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Сохранить тестовую базу с данными между запусками')
+
+    def get_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        user_id = IsSubscribed.objects.values('user').annotate(
+            total=Count('pk')
+        ).order_by('-total').values_list('user', flat=True).first()
+        if user_id is None:
+            raise CommandError('В синтетических данных нет подписок')
+        return User.objects.get(pk=user_id)
+
+    def scenarios(self, user):
+        recipe = Recipes.objects.filter(author=user).first() or (
+            Recipes.objects.first())
+        if recipe is None:
+            raise CommandError('В синтетических данных нет рецептов')
+        tags = list(Tags.objects.values_list('slug', flat=True)[:2])
+        ingredient = Ingredients.objects.first()
+        ingredients = list(IngredientInRecipe.objects.filter(
+            recipe=recipe).values('ingredient_id', 'amount'))
+        tags_query = '&'.join(f'tags={slug}' for slug in tags)
+        return {
+            'recipes_list': ('get', '/api/recipes/?page=1', None),
+            'recipes_filtered': (
+                'get', f'/api/recipes/?cursor=&{tags_query}&is_favorited=0',
+                None),
+            'recipes_feed': ('get', '/api/recipes/feed/', None),
+            'recipe_detail': ('get', f'/api/recipes/{recipe.pk}/', None),
+            'subscriptions': (
+                'get', '/api/users/subscriptions/?recipes_limit=3', None),
+            'ingredients_search': (
+                'get', f'/api/ingredients/?name={ingredient.name[:3]}', None),
+            'download_shopping_cart': (
+                'get', '/api/recipes/download_shopping_cart/', None),
+            'recipe_create': ('post', '/api/recipes/', {
+                'name': 'Бенчмарк',
+                'text': 'Рецепт для замера',
+                'cooking_time': 10,
+                'tags': list(recipe.tags.values_list('pk', flat=True)),
+                'ingredients': [
+                    {'id': row['ingredient_id'], 'amount': row['amount']}
+                    for row in ingredients
+                ],
+            }),
+        }
+
+    def measure(self, client, method, url, data, options):
+        """Время в мс и число запросов каждого прогона после прогрева."""
+        timings, queries = [], []
+        for iteration in range(options['warmup'] + options['iterations']):
+            if options['cold']:
+                cache.clear()
+            # Записи откатываются, чтобы каждый прогон видел те же данные;
+            # чтения не откатываются, иначе пропадал бы и кеш ответов.
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    if data is None:
+                        response = getattr(client, method)(url)
+                    else:
+                        response = getattr(client, method)(
+                            url, json.dumps(data),
+                            content_type='application/json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                transaction.set_rollback(method != 'get')
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {url}: {response.status_code}')
+            if iteration >= options['warmup']:
+                timings.append(elapsed * 1000)
+                queries.append(len(captured))
+        return timings, queries
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                old_name = connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+                try:
+                    if not Recipes.objects.exists():
+                        call_command(
+                            'generate_data', seed=options['seed'],
+                            users=options['users'],
+                            recipes=options['recipes'],
+                            stdout=self.stderr)
+                    self.benchmark(options)
+                finally:
+                    connection.creation.destroy_test_db(
+                        old_name, verbosity=0, keepdb=options['keepdb'])
+        finally:
+            teardown_test_environment()
+
+    def benchmark(self, options):
+        user = self.get_user(options['user'])
+        token = Token.objects.get_or_create(user=user)[0]
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = self.scenarios(user)
+        budgets = COLD_QUERY_BUDGETS if options['cold'] else QUERY_BUDGETS
+        results = {}
+        for name in options['only'] or QUERY_BUDGETS:
+            method, url, data = scenarios[name]
+            timings, queries = self.measure(
+                client, method, url, data, options)
+            results[name] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'max_ms': round(max(timings), 2),
+                'queries': max(queries),
+                'budget': budgets[name],
+            }
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(
+                f'{"эндпоинт":<24}{"p50":>9}{"p95":>9}{"p99":>9}'
+                f'{"max":>9}{"запросы":>10}'
+            )
+            for name, row in results.items():
+                self.stdout.write(
+                    f'{name:<24}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                    f'{row["p99_ms"]:>9}{row["max_ms"]:>9}'
+                    f'{row["queries"]:>6}/{row["budget"]:<3}'
+                )
+        exceeded = [
+            f'{name}: {row["queries"]} > {row["budget"]}'
+            for name, row in results.items()
+            if row['queries'] > row['budget']
+        ]
+        if exceeded:
+            raise CommandError(
+                'Превышен бюджет запросов: ' + ', '.join(exceeded))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.similar import METRICS, build_similar, np
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает похожие рецепты по составу ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все рецепты, а не только изменённые')
+        parser.add_argument(
+            '--metric', choices=METRICS, default='jaccard',
+            help='Мера сходства наборов ингредиентов')
+        parser.add_argument(
+            '--count', type=int, default=settings.SIMILAR_RECIPES_COUNT,
+            help='Число соседей для каждого рецепта')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Число рецептов, обрабатываемых за один шаг')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = build_similar(
+            options['count'], options['metric'], options['chunk_size'],
+            rebuild=options['all']
+        )
+        self.stdout.write(
+            f'Похожие рецепты обновлены для {total} рецептов за '
+            f'{time.monotonic() - started:.1f} с '
+            f'({"NumPy" if np is not None else "Python"})'
+        )
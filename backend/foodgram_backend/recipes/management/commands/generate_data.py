@@ -0,0 +1,154 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import (IngredientInRecipe, Ingredients, IsFavorite,
+                            IsInShoppingCart, IsSubscribed, Recipes, Tags,
+                            User)
+from recipes.search import reindex_recipes
+from recipes.versions import bump_version
+
+DISHES = (
+    'Борщ', 'Щи', 'Солянка', 'Плов', 'Омлет', 'Блины', 'Сырники',
+    'Запеканка', 'Котлеты', 'Рагу', 'Салат', 'Пирог', 'Каша', 'Суп',
+    'Паста', 'Ризотто', 'Жаркое', 'Оладьи', 'Гуляш', 'Голубцы',
+)
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'посолить', 'перемешать',
+    'тушить', 'запекать', 'варить', 'минут', 'до', 'готовности', 'на',
+    'среднем', 'огне', 'подавать', 'горячим', 'с', 'зеленью', 'сметаной',
+    'ёжик', 'картофель', 'лук', 'морковь', 'масло', 'мука', 'яйцо',
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class Command(BaseCommand):
+    help = 'Создаёт воспроизводимый синтетический набор данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients', type=int, default=500,
+            help='Минимальное число ингредиентов, недостающие создаются')
+        parser.add_argument('--min-ingredients', type=int, default=5)
+        parser.add_argument('--max-ingredients', type=int, default=30)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранных рецептов на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в корзине на пользователя')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя')
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Префикс имён создаваемых пользователей')
+        parser.add_argument('--password', default='synthetic-password')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def create(self, model, objects, batch_size):
+        started = time.monotonic()
+        objects = list(objects)
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=batch_size,
+                                      ignore_conflicts=True)
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {len(objects)} строк '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+
+    def create_catalog(self, rng, options):
+        batch_size = options['batch_size']
+        missing = options['ingredients'] - Ingredients.objects.count()
+        self.create(Ingredients, (
+            Ingredients(name=f'Продукт {index}',
+                        measurement_unit=rng.choice(UNITS))
+            for index in range(max(missing, 0))
+        ), batch_size)
+        self.create(Tags, (
+            Tags(name=f'Тег {index}', slug=f'tag-{index}',
+                 color=f'#{rng.randrange(16 ** 6):06X}')
+            for index in range(options['tags'])
+        ), batch_size)
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        password = make_password(options['password'])
+        self.create(User, (
+            User(username=f'{prefix}{index}',
+                 email=f'{prefix}{index}@example.com',
+                 password=password)
+            for index in range(options['users'])
+        ), options['batch_size'])
+        return list(User.objects.filter(
+            username__startswith=prefix).values_list('pk', flat=True))
+
+    def create_recipes(self, rng, user_ids, options):
+        batch_size = options['batch_size']
+        last_id = Recipes.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.create(Recipes, (
+            Recipes(
+                author_id=rng.choice(user_ids),
+                name=f'{rng.choice(DISHES)} {index}'[:16],
+                text=' '.join(rng.choices(WORDS, k=rng.randint(10, 60))),
+                cooking_time=rng.randint(5, 180)
+            )
+            for index in range(options['recipes'])
+        ), batch_size)
+        recipe_ids = list(Recipes.objects.filter(
+            pk__gt=last_id).values_list('pk', flat=True))
+        ingredient_ids = list(Ingredients.objects.values_list('pk', flat=True))
+        tag_ids = list(Tags.objects.values_list('pk', flat=True))
+        sizes = (options['min_ingredients'],
+                 min(options['max_ingredients'], len(ingredient_ids)))
+        self.create(IngredientInRecipe, (
+            IngredientInRecipe(recipe_id=recipe_id, ingredient_id=pk,
+                               amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for pk in rng.sample(ingredient_ids, rng.randint(*sizes))
+        ), batch_size)
+        self.create(Recipes.tags.through, (
+            Recipes.tags.through(recipes_id=recipe_id, tags_id=pk)
+            for recipe_id in recipe_ids
+            for pk in rng.sample(tag_ids, rng.randint(1, min(3, len(tag_ids))))
+        ), batch_size)
+        return recipe_ids
+
+    def create_relations(self, rng, user_ids, recipe_ids, options):
+        batch_size = options['batch_size']
+        for model, count in ((IsFavorite, options['favorites']),
+                             (IsInShoppingCart, options['carts'])):
+            self.create(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rng.sample(
+                    recipe_ids, min(count, len(recipe_ids)))
+            ), batch_size)
+        self.create(IsSubscribed, (
+            IsSubscribed(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in rng.sample(
+                user_ids, min(options['follows'] + 1, len(user_ids)))
+            if author_id != user_id
+        ), batch_size)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.create_catalog(rng, options)
+        user_ids = self.create_users(options)
+        recipe_ids = self.create_recipes(rng, user_ids, options)
+        self.create_relations(rng, user_ids, recipe_ids, options)
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_cart_totals', stdout=self.stdout)
+        reindex_recipes()
+        for name in ('ingredients', 'tags', 'recipes', 'users',
+                     'recipe_ingredients'):
+            bump_version(name)
+        for user_id in user_ids:
+            for name in ('favorites', 'shopping_carts', 'subscriptions'):
+                bump_version(f'{name}:{user_id}')
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
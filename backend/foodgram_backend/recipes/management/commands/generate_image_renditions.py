@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from recipes.images import create_renditions
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить копии и для рецептов, где они уже есть')
+
+    def handle(self, *args, **options):
+        recipes = Recipes.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            recipes = recipes.filter(
+                Q(image_thumbnail='') | Q(image_thumbnail=None)
+                | Q(image_card='') | Q(image_card=None)
+            )
+        total = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            create_renditions(recipe_id)
+            total += 1
+        self.stdout.write(f'Обработано рецептов: {total}')
@@ -1,28 +1,76 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from recipes.models import Ingredients, Tags
+from recipes.versions import bump_version
+
+DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
+
+
+def read_rows(path, fields):
+    """Построчно читает CSV без заголовка или NDJSON в словари."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in file:
+                if line.strip():
+                    row = json.loads(line)
+                    yield {field: row[field] for field in fields}
+        else:
+            for row in csv.reader(file):
+                if row:
+                    yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты и теги из CSV или NDJSON пакетами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(DATA_DIR, 'ingredients.csv'),
+            help='Файл ингредиентов: name,measurement_unit')
+        parser.add_argument(
+            '--tags',
+            default=os.path.join(DATA_DIR, 'tags.csv'),
+            help='Файл тегов: name,color,slug')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одной транзакции')
+
+    def load(self, model, path, fields, batch_size, version_name):
+        """Вставляет строки пакетами и меняет версию набора в той же
+        транзакции, чтобы работающие процессы API сразу увидели новые данные.
+        """
+        rows = read_rows(path, fields)
+        total = 0
+        started = time.monotonic()
+        while True:
+            batch = [model(**row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                bump_version(version_name)
+            total += len(batch)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {total} строк, '
+                f'{total / elapsed if elapsed else total:.0f} строк/с'
+            )
+        return total
+
     def handle(self, *args, **options):
         self.stdout.write('Загрузка данных')
-        with open(
-            './data/ingredients.csv', encoding='utf-8',
-                newline='') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                name, unit = row
-                Ingredients.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit)
-            self.stdout.write('Ингредиенты успешно внесены в базу')
-        with open('./data/tags.csv', encoding='utf-8', newline='') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                name, color, slug = row
-                Tags.objects.get_or_create(
-                    name=name,
-                    color=color,
-                    slug=slug)
-            self.stdout.write('Теги успешно внесены в базу')
+        batch_size = options['batch_size']
+        self.load(Ingredients, options['ingredients'],
+                  ('name', 'measurement_unit'), batch_size, 'ingredients')
+        self.stdout.write('Ингредиенты успешно внесены в базу')
+        self.load(Tags, options['tags'], ('name', 'color', 'slug'),
+                  batch_size, 'tags')
+        self.stdout.write('Теги успешно внесены в базу')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import ShoppingCartTotal
+from recipes.shopping_cart import calculate_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги списков покупок и сообщает о расхождениях'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их')
+
+    def handle(self, *args, **options):
+        expected = calculate_totals()
+        stored = {
+            (row['user'], row['ingredient']): row['amount']
+            for row in ShoppingCartTotal.objects.values(
+                'user', 'ingredient', 'amount')
+        }
+        missing = expected.keys() - stored.keys()
+        extra = stored.keys() - expected.keys()
+        wrong = [
+            key for key in expected.keys() & stored.keys()
+            if expected[key] != stored[key]
+        ]
+        self.stdout.write(
+            f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+            f'неверных: {len(wrong)}'
+        )
+        if options['dry_run'] or not (missing or extra or wrong):
+            return
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                (ShoppingCartTotal(user_id=user_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=amount)
+                 for (user_id, ingredient_id), amount in expected.items()),
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS('Итоги пересчитаны'))
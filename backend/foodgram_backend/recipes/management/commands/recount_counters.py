@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from recipes.counters import recount
+from recipes.models import IsFavorite, IsSubscribed, Recipes, User
+from recipes.versions import bump_version
+
+COUNTERS = (
+    (Recipes, 'favorites_count', IsFavorite, 'recipe'),
+    (User, 'recipes_count', Recipes, 'author'),
+    (User, 'followers_count', IsSubscribed, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их')
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            drift = recount(model, field, related_model, related_field,
+                            options['dry_run'])
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'расхождений {drift}'
+            )
+        if not options['dry_run']:
+            bump_version('favorites_count')
+            bump_version('users')
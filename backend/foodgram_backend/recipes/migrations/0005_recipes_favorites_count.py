@@ -0,0 +1,44 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:07
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(models.Subquery(
+        model.objects.filter(
+            **{field: models.OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=models.Count('pk')
+        ).values('total'),
+        output_field=models.IntegerField()
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    IsFavorite = apps.get_model('recipes', 'IsFavorite')
+    IsSubscribed = apps.get_model('recipes', 'IsSubscribed')
+    User = apps.get_model('users', 'User')
+    Recipes.objects.update(
+        favorites_count=count_subquery(IsFavorite, 'recipe'))
+    User.objects.update(
+        recipes_count=count_subquery(Recipes, 'author'),
+        followers_count=count_subquery(IsSubscribed, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_counters'),
+        ('recipes', '0004_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
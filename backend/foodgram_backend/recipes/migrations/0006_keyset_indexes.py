@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipes_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipes',
+            options={'ordering': ['name', 'id'], 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AddIndex(
+            model_name='issubscribed',
+            index=models.Index(fields=['user', '-id'], name='subscribed_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-date', '-id'], name='recipes_date_id_idx'),
+        ),
+    ]
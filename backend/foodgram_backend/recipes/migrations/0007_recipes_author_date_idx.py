@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['author', '-date'], name='recipes_author_date_idx'),
+        ),
+    ]
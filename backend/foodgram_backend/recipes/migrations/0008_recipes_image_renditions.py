@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipes_author_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='image_card',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='recipes/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='recipes/renditions/'),
+        ),
+    ]
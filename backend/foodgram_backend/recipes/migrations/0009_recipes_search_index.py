@@ -0,0 +1,54 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:13
+
+from django.db import migrations
+
+FTS_TABLE = 'recipes_recipes_fts'
+GIN_INDEX = 'recipes_search_gin_idx'
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} "
+            f"ON recipes_recipes USING gin (("
+            f"setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+            f"setweight(to_tsvector('russian', COALESCE(text, '')), 'B')))"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"name, text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        Recipes = apps.get_model('recipes', 'Recipes')
+        rows = Recipes.objects.values_list('id', 'name', 'text')
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)',
+                [(pk, normalize(name), normalize(text))
+                 for pk, name, text in rows.iterator()]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX}')
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipes_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
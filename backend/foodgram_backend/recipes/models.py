@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Q,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+
+from .counters import UpdateOnlyFieldsMixin
 
 User = get_user_model()
 
@@ -49,7 +54,81 @@ class Tags(models.Model):
         return f'{self.name}'
 
 
-class Recipes(models.Model):
+class RecipesQuerySet(models.QuerySet):
+    """Запросы к рецептам."""
+
+    def with_related(self):
+        """Загружает автора, теги и ингредиенты рецептов пакетно."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient').order_by('ingredient__name', 'ingredient_id')
+            )
+        )
+
+    def first_per_author(self, limit):
+        """Первые limit рецептов каждого автора одним оконным запросом."""
+        ranked = self.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=[F('name').asc(), F('id').asc()]
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            f'WHERE ranked.recipe_rank <= %s '
+            f'ORDER BY ranked.author_id, ranked.recipe_rank',
+            (*params, limit)
+        )
+
+    def feed(self, user, limit, before=None):
+        """Новые рецепты авторов, на которых подписан user.
+
+        before — ключ (date, id), после которого продолжается лента. В
+        PostgreSQL от каждого автора берётся не больше limit строк по
+        индексу (author, -date), и эти потоки сливаются в один, так что
+        стоимость не зависит от длины истории авторов.
+        """
+        if connection.vendor != 'postgresql':
+            queryset = self.filter(author__following__user=user)
+            if before:
+                date, pk = before
+                queryset = queryset.filter(
+                    Q(date__lt=date) | Q(date=date, id__lt=pk))
+            return queryset.order_by('-date', '-id').only(
+                'id', 'date')[:limit]
+        keyset = 'AND (date, id) < (%s, %s)' if before else ''
+        return self.model.objects.raw(
+            f'SELECT recipe.id, recipe.date '
+            f'FROM {IsSubscribed._meta.db_table} AS follow '
+            f'CROSS JOIN LATERAL ('
+            f'SELECT id, date FROM {self.model._meta.db_table} '
+            f'WHERE author_id = follow.author_id {keyset} '
+            f'ORDER BY date DESC, id DESC LIMIT %s'
+            f') AS recipe '
+            f'WHERE follow.user_id = %s '
+            f'ORDER BY recipe.date DESC, recipe.id DESC LIMIT %s',
+            (*(before or ()), limit, user.pk, limit)
+        )
+
+    def with_user_flags(self, user):
+        """Добавляет признаки is_favorited и is_in_shopping_cart."""
+        if not user or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(IsFavorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(IsInShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+
+class Recipes(UpdateOnlyFieldsMixin, models.Model):
     """Модель рецептов."""
     name = models.CharField(max_length=16)
     tags = models.ManyToManyField(Tags, related_name='recipes',
@@ -62,6 +141,11 @@ class Recipes(models.Model):
                                          through='IngredientInRecipe')
     image = models.ImageField(upload_to='recipes/images/',
                               null=True, default=None, blank=True)
+    image_thumbnail = models.ImageField(upload_to='recipes/renditions/',
+                                        null=True, blank=True,
+                                        editable=False)
+    image_card = models.ImageField(upload_to='recipes/renditions/',
+                                   null=True, blank=True, editable=False)
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveIntegerField(
         default=1, validators=[MinValueValidator(1, message='минимум 1')],
@@ -71,11 +155,26 @@ class Recipes(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name='Добавлений в избранное'
+    )
+    similar_stale = models.BooleanField(
+        default=True, db_index=True, editable=False,
+        verbose_name='Похожие рецепты устарели'
+    )
+
+    objects = RecipesQuerySet.as_manager()
+    update_only_fields = ('favorites_count', 'similar_stale')
 
     class Meta:
-        ordering = ['name']
+        ordering = ['name', 'id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='recipes_date_id_idx'),
+            models.Index(fields=['author', '-date'],
+                         name='recipes_author_date_idx')
+        ]
 
     def __str__(self):
         return self.name
@@ -156,6 +255,9 @@ class IsSubscribed(models.Model):
                 name='unique_user_author'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', '-id'], name='subscribed_user_id_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} подписан {self.author}'
@@ -184,3 +286,75 @@ class IsInShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingCartTotal(models.Model):
+    """Модель итогового количества ингредиента в списке покупок."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_cart_totals',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredients,
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_cart_totals',
+                                   verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        ordering = ['ingredient']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_total'
+            )
+        ]
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class SimilarRecipe(models.Model):
+    """Модель заранее рассчитанных похожих рецептов."""
+    recipe = models.ForeignKey(Recipes,
+                               on_delete=models.CASCADE,
+                               related_name='similar_recipes',
+                               verbose_name='Рецепт')
+    similar = models.ForeignKey(Recipes,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name='Похожий рецепт')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ['recipe', '-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx')
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar} ({self.score:.2f})'
+
+
+class DataVersion(models.Model):
+    """Версия набора данных, общая для всех процессов."""
+    name = models.CharField('Набор данных', max_length=100,
+                            primary_key=True)
+    version = models.BigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name} {self.version}'
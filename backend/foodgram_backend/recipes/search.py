@@ -0,0 +1,100 @@
+"""Полнотекстовый поиск рецептов.
+
+В PostgreSQL используется выражение to_tsvector с русской морфологией и
+GIN-индекс по тому же выражению. В SQLite, для локального запуска и тестов,
+используется отдельная таблица FTS5, которую заполняют сигналы модели;
+морфология там приближается поиском по началу слова.
+"""
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipes
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipes_fts'
+WORD = re.compile(r'\w+')
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска: регистр и ё не различаются."""
+    return value.casefold().replace('ё', 'е')
+
+
+def search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def fts_query(value):
+    """Запрос FTS5: все слова, каждое по началу без окончания."""
+    words = WORD.findall(normalize(value))
+    return ' '.join(
+        '"{}"*'.format(word[:-2] if len(word) > 5 else word)
+        for word in words
+    )
+
+
+def search_recipes(queryset, value):
+    """Фильтрует рецепты по запросу и сортирует по релевантности."""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        vector = search_vector()
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search=vector, rank=SearchRank(vector, query)
+        ).filter(search=query).order_by('-rank', 'id')
+    if vendor == 'sqlite':
+        match = fts_query(value)
+        if not match:
+            return queryset
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = {queryset.model._meta.db_table}.id',
+            (match,)
+        )).order_by('rank', 'id')
+    return queryset.filter(Q(name__icontains=value) | Q(text__icontains=value))
+
+
+def index_recipe(recipe):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) VALUES (%s, %s, %s)',
+            (recipe.pk, normalize(recipe.name), normalize(recipe.text))
+        )
+
+
+def unindex_recipe(recipe_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe_id,))
+
+
+def reindex_recipes():
+    """Перестраивает таблицу FTS5 после массовой вставки рецептов."""
+    if connection.vendor != 'sqlite':
+        return
+    rows = Recipes.objects.values_list('pk', 'name', 'text')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) VALUES (%s, %s, %s)',
+            [(pk, normalize(name), normalize(text))
+             for pk, name, text in rows.iterator()]
+        )
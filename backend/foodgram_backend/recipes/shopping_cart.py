@@ -0,0 +1,55 @@
+"""Поддержка таблицы итогов списков покупок.
+"""
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import IngredientInRecipe, ShoppingCartTotal, User
+
+
+def calculate_totals(user_ids=None, ingredient_ids=None):
+    """Итоги по данным корзин: {(user_id, ingredient_id): amount}."""
+    rows = IngredientInRecipe.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(recipe__shopping_carts__user__in=user_ids)
+    if ingredient_ids is not None:
+        rows = rows.filter(ingredient__in=ingredient_ids)
+    rows = rows.values(
+        'recipe__shopping_carts__user', 'ingredient'
+    ).annotate(amount=Sum('amount')).order_by()
+    return {
+        (row['recipe__shopping_carts__user'], row['ingredient']):
+            row['amount']
+        for row in rows
+        if row['recipe__shopping_carts__user'] is not None
+    }
+
+
+def refresh_totals(user_ids, ingredient_ids=None):
+    """Пересчитывает итоги только для затронутых пар пользователь-продукт."""
+    user_ids = list(user_ids)
+    if not user_ids or ingredient_ids is not None and not ingredient_ids:
+        return
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids).values_list('pk', flat=True))
+        totals = calculate_totals(user_ids, ingredient_ids)
+        stale = ShoppingCartTotal.objects.filter(user__in=user_ids)
+        if ingredient_ids is not None:
+            stale = stale.filter(ingredient__in=ingredient_ids)
+        stale.delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                              amount=amount)
+            for (user_id, ingredient_id), amount in totals.items()
+        )
+
+
+def refresh_recipe_totals(recipe_id, ingredient_ids, user_ids=None):
+    """Пересчитывает итоги пользователей, у которых рецепт в корзине."""
+    ingredient_ids = list(ingredient_ids)
+    if not ingredient_ids:
+        return
+    if user_ids is None:
+        user_ids = User.objects.filter(
+            shopping_carts__recipe=recipe_id).values_list('pk', flat=True)
+    refresh_totals(user_ids, ingredient_ids)
@@ -0,0 +1,151 @@
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .models import (IngredientInRecipe, Ingredients, IsFavorite,
+                     IsInShoppingCart, IsSubscribed, Recipes, Tags, User)
+from .search import index_recipe, unindex_recipe
+from .shopping_cart import refresh_recipe_totals, refresh_totals
+from .similar import recipe_ingredients_changed
+from .versions import bump_version, bump_version_on_commit
+
+pending_ingredients = threading.local()
+
+
+@receiver([post_save, post_delete], sender=Ingredients)
+def ingredients_changed(sender, **kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver([post_save, post_delete], sender=Tags)
+def tags_changed(sender, **kwargs):
+    bump_version_on_commit('tags')
+
+
+@receiver([post_save, post_delete], sender=Recipes)
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def recipes_changed(sender, action=None, **kwargs):
+    if action is None or action.startswith('post_'):
+        bump_version_on_commit('recipes')
+
+
+@receiver(pre_delete, sender=Recipes)
+def recipe_deleting(sender, instance, **kwargs):
+    Recipes.objects.filter(similar_recipes__similar=instance).update(
+        similar_stale=True)
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_ingredients_deleted(sender, instance, **kwargs):
+    bump_version_on_commit('recipe_ingredients', instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def users_changed(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version_on_commit('users')
+
+
+@receiver([post_save, post_delete], sender=IsFavorite)
+def favorites_changed(sender, instance, **kwargs):
+    bump_version_on_commit(f'favorites:{instance.user_id}')
+
+
+def change_counter(model, pk, field, signal, created=False):
+    """Атомарно меняет счётчик при создании или удалении записи."""
+    if signal is post_delete:
+        model.objects.filter(pk=pk, **{f'{field}__gt': 0}).update(
+            **{field: F(field) - 1})
+    elif created:
+        model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+    else:
+        return
+    bump_version_on_commit('favorites_count' if model is Recipes else 'users')
+
+
+@receiver([post_save, post_delete], sender=IsFavorite)
+def favorites_count_changed(sender, instance, signal, **kwargs):
+    change_counter(Recipes, instance.recipe_id, 'favorites_count', signal,
+                   kwargs.get('created', False))
+
+
+@receiver([post_save, post_delete], sender=Recipes)
+def recipes_count_changed(sender, instance, signal, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', signal,
+                   kwargs.get('created', False))
+
+
+@receiver([post_save, post_delete], sender=IsSubscribed)
+def followers_count_changed(sender, instance, signal, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', signal,
+                   kwargs.get('created', False))
+
+
+@receiver([post_save, post_delete], sender=IsInShoppingCart)
+def shopping_carts_changed(sender, instance, **kwargs):
+    bump_version_on_commit(f'shopping_carts:{instance.user_id}')
+
+
+@receiver([post_save, post_delete], sender=IsSubscribed)
+def subscriptions_changed(sender, instance, **kwargs):
+    bump_version_on_commit(f'subscriptions:{instance.user_id}')
+
+
+@receiver(pre_delete, sender=IsInShoppingCart)
+def shopping_cart_deleting(sender, instance, **kwargs):
+    instance.ingredient_ids = list(IngredientInRecipe.objects.filter(
+        recipe=instance.recipe_id).values_list('ingredient_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=IsInShoppingCart)
+def shopping_cart_totals_changed(sender, instance, **kwargs):
+    ingredient_ids = getattr(instance, 'ingredient_ids', None)
+    if ingredient_ids is None:
+        ingredient_ids = IngredientInRecipe.objects.filter(
+            recipe=instance.recipe_id).values_list('ingredient_id', flat=True)
+    refresh_totals([instance.user_id], list(ingredient_ids))
+
+
+def recipe_ingredients_changed_on_commit(recipe_id, ingredient_ids):
+    """Откладывает обработку изменений состава рецепта до фиксации.
+
+    Изменения всех строк транзакции собираются вместе: итоги корзин,
+    похожие рецепты и версия 'recipes' обновляются один раз на рецепт.
+    Лишние вызовы apply_ingredient_changes ничего не делают, а записи,
+    оставшиеся после отката, только вызовут повторный пересчёт.
+    """
+    recipes = pending_ingredients.__dict__.setdefault('recipes', {})
+    recipes.setdefault(recipe_id, set()).update(ingredient_ids)
+    transaction.on_commit(apply_ingredient_changes)
+
+
+def apply_ingredient_changes():
+    recipes = pending_ingredients.__dict__.pop('recipes', None)
+    if not recipes:
+        return
+    for recipe_id, ingredient_ids in recipes.items():
+        refresh_recipe_totals(recipe_id, ingredient_ids)
+        recipe_ingredients_changed(recipe_id)
+    bump_version('recipes')
+
+
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def ingredient_in_recipe_changed(sender, instance, **kwargs):
+    recipe_ingredients_changed_on_commit(
+        instance.recipe_id, [instance.ingredient_id])
+
+
+@receiver(post_save, sender=Recipes)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_deleted(sender, instance, **kwargs):
+    unindex_recipe(instance.pk)
@@ -0,0 +1,196 @@
+"""Похожие рецепты по составу ингредиентов.
+
+Соседи считаются пакетно командой build_similar_recipes и хранятся в
+таблице SimilarRecipe, так что API читает готовый список по индексу.
+С NumPy и SciPy сходство считается умножением разреженной матрицы
+рецепт × ингредиент порциями строк, без них — по обратному индексу.
+"""
+import heapq
+import math
+from collections import Counter
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import IngredientInRecipe, Recipes, SimilarRecipe
+from .versions import bump_version_on_commit
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+METRICS = ('jaccard', 'cosine')
+
+
+def recipe_ingredients_changed(recipe_id):
+    """Отмечает изменение состава рецепта для индексов и похожих рецептов."""
+    Recipes.objects.filter(pk=recipe_id, similar_stale=False).update(
+        similar_stale=True)
+    bump_version_on_commit('recipe_ingredients', recipe_id)
+
+
+def load_sets():
+    """Составы рецептов: {recipe_id: set(ingredient_id)}."""
+    sets = {}
+    rows = IngredientInRecipe.objects.values_list(
+        'recipe_id', 'ingredient_id').order_by()
+    for recipe_id, ingredient_id in rows.iterator():
+        sets.setdefault(recipe_id, set()).add(ingredient_id)
+    return sets
+
+
+def similarity(common, size, other_size, metric):
+    if metric == 'cosine':
+        return common / math.sqrt(size * other_size)
+    return common / (size + other_size - common)
+
+
+def python_neighbours(sets, recipe_ids, count, metric):
+    postings = {}
+    for recipe_id, ingredients in sets.items():
+        for ingredient_id in ingredients:
+            postings.setdefault(ingredient_id, []).append(recipe_id)
+    for recipe_id in recipe_ids:
+        ingredients = sets.get(recipe_id, ())
+        common = Counter(chain.from_iterable(
+            postings[ingredient_id] for ingredient_id in ingredients))
+        common.pop(recipe_id, None)
+        scored = [
+            (similarity(total, len(ingredients), len(sets[other]), metric),
+             other)
+            for other, total in common.items()
+        ]
+        if count is not None:
+            scored = heapq.nlargest(
+                count, scored, key=lambda item: (item[0], -item[1]))
+        else:
+            scored.sort(key=lambda item: (-item[0], item[1]))
+        yield recipe_id, scored
+
+
+def numpy_neighbours(sets, recipe_ids, count, metric, chunk_size):
+    ids = np.array(sorted(sets), dtype=np.int64)
+    positions = {
+        recipe_id: index for index, recipe_id in enumerate(ids.tolist())}
+    columns = {}
+    rows, cols = [], []
+    for recipe_id, ingredients in sets.items():
+        for ingredient_id in ingredients:
+            rows.append(positions[recipe_id])
+            cols.append(columns.setdefault(ingredient_id, len(columns)))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(ids), len(columns)))
+    transposed = matrix.T.tocsc()
+    sizes = np.asarray(matrix.sum(axis=1)).ravel()
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), chunk_size):
+        chunk = recipe_ids[start:start + chunk_size]
+        indexed = [recipe_id for recipe_id in chunk if recipe_id in positions]
+        for recipe_id in chunk:
+            if recipe_id not in positions:
+                yield recipe_id, []
+        if not indexed:
+            continue
+        own = np.array([positions[recipe_id] for recipe_id in indexed])
+        common = (matrix[own] @ transposed).tocsr()
+        row_of = np.repeat(np.arange(len(own)), np.diff(common.indptr))
+        size, other_size = sizes[own][row_of], sizes[common.indices]
+        if metric == 'cosine':
+            scores = common.data / np.sqrt(size * other_size)
+        else:
+            scores = common.data / (size + other_size - common.data)
+        for row, recipe_id in enumerate(indexed):
+            begin, end = common.indptr[row], common.indptr[row + 1]
+            others = common.indices[begin:end]
+            row_scores = scores[begin:end]
+            keep = others != own[row]
+            others, row_scores = others[keep], row_scores[keep]
+            if count is not None and len(others) > count:
+                lowest = -np.partition(-row_scores, count - 1)[count - 1]
+                top = row_scores >= lowest
+                others, row_scores = others[top], row_scores[top]
+            order = np.lexsort((ids[others], -row_scores))[:count]
+            yield recipe_id, [
+                (float(row_scores[index]), int(ids[others[index]]))
+                for index in order
+            ]
+
+
+def neighbours(sets, recipe_ids, count, metric, chunk_size):
+    """Для каждого рецепта список (сходство, id соседа), лучшие первыми.
+
+    При count=None возвращаются все рецепты с общими ингредиентами.
+    """
+    if np is not None:
+        return numpy_neighbours(sets, recipe_ids, count, metric, chunk_size)
+    return python_neighbours(sets, recipe_ids, count, metric)
+
+
+def affected_recipes(sets, stale_ids, count, metric, chunk_size):
+    """Рецепты, чьи списки соседей могут поменяться из-за stale_ids."""
+    affected = set(SimilarRecipe.objects.filter(
+        similar__in=stale_ids).values_list('recipe_id', flat=True))
+    best = {}
+    for _, scored in neighbours(sets, stale_ids, None, metric, chunk_size):
+        for score, other in scored:
+            best[other] = max(best.get(other, 0), score)
+    thresholds = {
+        row['recipe']: (row['total'], row['lowest'])
+        for row in SimilarRecipe.objects.filter(
+            recipe__in=list(best)
+        ).order_by().values('recipe').annotate(
+            total=Count('pk'), lowest=Min('score'))
+    }
+    for other, score in best.items():
+        total, lowest = thresholds.get(other, (0, 0))
+        if total < count or score > lowest:
+            affected.add(other)
+    return affected - set(stale_ids)
+
+
+def save_neighbours(rows):
+    """Заменяет сохранённых соседей для рецептов из rows."""
+    recipe_ids = [recipe_id for recipe_id, _ in rows]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=recipe_ids).delete()
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+            for recipe_id, scored in rows
+            for score, other in scored
+        ])
+
+
+def build_similar(count, metric='jaccard', chunk_size=500, rebuild=False):
+    """Пересчитывает соседей; возвращает число обновлённых рецептов.
+
+    Без rebuild пересчитываются рецепты с изменённым составом и те, в чьи
+    списки они входят или могут войти.
+    """
+    stale = Recipes.objects.all()
+    if not rebuild:
+        stale = stale.filter(similar_stale=True)
+    stale_ids = list(stale.values_list('pk', flat=True))
+    if not stale_ids:
+        return 0
+    Recipes.objects.filter(pk__in=stale_ids).update(similar_stale=False)
+    try:
+        sets = load_sets()
+        targets = stale_ids
+        if not rebuild:
+            targets = stale_ids + sorted(affected_recipes(
+                sets, stale_ids, count, metric, chunk_size))
+        rows = []
+        for row in neighbours(sets, targets, count, metric, chunk_size):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                save_neighbours(rows)
+                rows = []
+        if rows:
+            save_neighbours(rows)
+    except Exception:
+        Recipes.objects.filter(pk__in=stale_ids).update(similar_stale=True)
+        raise
+    return len(targets)
@@ -0,0 +1,94 @@
+"""Счётчики версий данных для сброса кешей в процессах.
+
+Версии хранятся в таблице DataVersion, поэтому изменение, сделанное
+в одном процессе (запросе, воркере или management-команде), видно всем
+остальным. Набор без записи в таблице имеет версию 0; первая запись
+начинается со времени создания, чтобы номера не повторялись после
+очистки таблицы.
+
+Индексы в памяти процесса сверяются с таблицей через get_local_version:
+не чаще раза в DATA_VERSION_CHECK_INTERVAL секунд, а версии, уже
+прочитанные запросом или поднятые самим процессом, учитываются сразу.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+CHANGE_KEY = 'change:{}:{}'
+CHANGE_TIMEOUT = 60 * 60
+
+# Последние прочитанные процессом версии: {name: (версия, время чтения)}.
+local_versions = {}
+
+
+def get_version(name):
+    """Текущая версия набора данных name."""
+    version = DataVersion.objects.filter(name=name).values_list(
+        'version', flat=True).first() or 0
+    local_versions[name] = (version, time.monotonic())
+    return version
+
+
+def get_versions(names):
+    """Версии нескольких наборов данных одним запросом."""
+    versions = dict(DataVersion.objects.filter(
+        name__in=names).values_list('name', 'version'))
+    now = time.monotonic()
+    for name in names:
+        local_versions[name] = (versions.get(name, 0), now)
+    return [versions.get(name, 0) for name in names]
+
+
+def get_local_version(name):
+    """Версия набора name, прочитанная не раньше интервала проверки."""
+    known = local_versions.get(name)
+    if (known is None or time.monotonic() - known[1]
+            >= settings.DATA_VERSION_CHECK_INTERVAL):
+        return get_version(name)
+    return known[0]
+
+
+def bump_version(name, change=None):
+    """Увеличивает версию набора данных name.
+
+    Если передан change, он сохраняется в кеше под новой версией, чтобы
+    другие процессы могли применить изменение, не перечитывая весь набор.
+    Без change обходится одним UPDATE.
+    """
+    local_versions.pop(name, None)
+    versions = DataVersion.objects.filter(name=name)
+    if not versions.update(version=F('version') + 1):
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(name=name, version=time.time_ns())
+        except IntegrityError:
+            versions.update(version=F('version') + 1)
+    if change is not None:
+        # Если версию успел поднять другой процесс, изменение окажется не
+        # под своим номером, и читатели перечитают набор целиком.
+        version = versions.values_list('version', flat=True).get()
+        cache.set(CHANGE_KEY.format(name, version), change, CHANGE_TIMEOUT)
+
+
+def bump_version_on_commit(name, change=None):
+    """Увеличивает версию после фиксации текущей транзакции.
+
+    Так строка DataVersion не остаётся заблокированной до конца транзакции
+    пишущего запроса, и записи в разные рецепты не ждут друг друга.
+    """
+    transaction.on_commit(lambda: bump_version(name, change))
+
+
+def get_changes(name, since, until):
+    """Изменения между версиями since и until или None, если их нет в кеше."""
+    keys = [CHANGE_KEY.format(name, version)
+            for version in range(since + 1, until + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
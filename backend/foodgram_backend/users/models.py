@@ -1,14 +1,20 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from recipes.counters import UpdateOnlyFieldsMixin
 
 
-class User(AbstractUser):
+class User(UpdateOnlyFieldsMixin, AbstractUser):
     email = models.EmailField(max_length=254, db_index=True, unique=True)
     username = models.CharField(
         db_index=True, max_length=150, unique=True
     )
     first_name = models.CharField(max_length=150, blank=True)
     last_name = models.CharField(max_length=150, blank=True)
+    recipes_count = models.PositiveIntegerField('Число рецептов', default=0)
+    followers_count = models.PositiveIntegerField('Число подписчиков',
+                                                  default=0)
+
+    update_only_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         ordering = ['username']